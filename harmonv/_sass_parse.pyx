@@ -0,0 +1,104 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+#
+# _sass_parse.pyx
+#
+# Compiled version of the per-line nvdisasm SASS parser in disassembler.py
+#
+# This scans the line in place instead of slicing it up, and must
+# return exactly what _fast_parse_nvdisasm_line returns. As there, lines
+# of unusual shape are handed to the regular expression passed in as
+# sass_match.
+#
+# SPDX-FileCopyrightText: 2024 University of Rochester
+#
+# SPDX-License-Identifier: MIT
+
+cdef inline bint _ishex(Py_UCS4 c):
+    return (u'0' <= c <= u'9') or (u'a' <= c <= u'f') or (u'A' <= c <= u'F')
+
+cdef Py_ssize_t _split_opcode(str l, Py_ssize_t *op_start, Py_ssize_t *op_end):
+    # find the trailing '/* 0x... */', returns the end of the text
+    # before it, or -1
+    cdef Py_ssize_t i = len(l) - 1
+    cdef Py_ssize_t j
+
+    if i < 7 or l[i] != u'/' or l[i-1] != u'*' or not l[i-2].isspace():
+        return -1
+
+    i -= 2
+    while i >= 0 and l[i].isspace():
+        i -= 1
+
+    j = i
+    while i >= 0 and _ishex(l[i]):
+        i -= 1
+
+    if i == j or i < 1 or l[i] != u'x' or l[i-1] != u'0':
+        return -1
+
+    op_start[0] = i - 1
+    op_end[0] = j + 1
+
+    i -= 2
+    if i < 0 or not l[i].isspace():
+        return -1
+
+    while i >= 0 and l[i].isspace():
+        i -= 1
+
+    if i < 2 or l[i] != u'*' or l[i-1] != u'/' or not l[i-2].isspace():
+        return -1
+
+    return i - 1
+
+cdef Py_ssize_t _split_loc(str l, Py_ssize_t h):
+    # find the leading '/*loc*/' in l[:h], returns the end of loc or -1
+    cdef Py_ssize_t p = 0
+    cdef Py_ssize_t q
+
+    while p < h and l[p].isspace():
+        p += 1
+
+    if p == 0 or p + 1 >= h or l[p] != u'/' or l[p+1] != u'*':
+        return -1
+
+    q = p + 2
+    while q < h and _ishex(l[q]):
+        q += 1
+
+    if q == p + 2 or q + 1 >= h or l[q] != u'*' or l[q+1] != u'/':
+        return -1
+
+    return q
+
+cpdef tuple parse_nvdisasm_line(str l, sass_match):
+    """Parse a line of nvdisasm -novliw SASS into (loc, branch_target, opcode).
+
+    Returns None if the line is not SASS."""
+
+    cdef Py_ssize_t op_start, op_end, h, p, q, e
+
+    if u'(*"' not in l:
+        h = _split_opcode(l, &op_start, &op_end)
+        if h >= 0:
+            p = 0
+            while p < h and l[p].isspace():
+                p += 1
+
+            if p == h:
+                return (None, None, l[op_start:op_end])
+
+            q = _split_loc(l, h)
+            if q >= 0 and q + 2 < h and l[q+2].isspace():
+                e = h - 1
+                while l[e].isspace():
+                    e -= 1
+
+                if l[e] == u';':
+                    return (l[p+2:q], None, l[op_start:op_end])
+
+    m = sass_match(l)
+    if m is None:
+        return None
+
+    return m.group('loc', 'branch_target', 'opcode')
@@ -45,9 +45,11 @@ class DisassemblyTokenizer(object):
     match = None
     _token_stream = None
 
-    def __init__(self, strdata, err, src = '<unknown>'):
+    def __init__(self, strdata, err, src = '<unknown>', lines = None):
         self.srcfile = src
         self.data = strdata
+        # lines can be passed in directly if the caller already has them
+        self.lines = strdata.split('\n') if lines is None else lines
         self._token_stream = self.tokenize()
         self.token, self.match = next(self._token_stream)
         self.err = err
@@ -82,7 +84,7 @@ class DisassemblyTokenizer(object):
 
         self._tokens[None] = "End-of-input"
 
-        for lno, l in enumerate(self.data.split('\n')):
+        for lno, l in enumerate(self.lines):
             self.line = l
 
             for m in re.finditer(tok_regex, l + '\n', flags=re.M):
@@ -179,10 +181,15 @@ class DisassemblyParser(object):
             elif tkn is None:
                 break
             else:
-                err.error(token_stream, f"Unexpected token {token_stream.token_name(tkn)}")
+                token_stream.error(f"Unexpected token {token_stream.token_name(tkn)}")
 
         return out
 
+    def parse_lines(self, lines):
+        """Like parse, but for disassembly that is already split into lines."""
+        token_stream = DisassemblyTokenizer(None, ParseError(), src = self.srcfile, lines = lines)
+        return self.parse(None, token_stream)
+
 
     # The instruction DEPBAR {0} ; can confuse the parser
     # because it reads DEPBAR {0 and END_VLIW and then finds a semicolon insted of an opcode
@@ -22,7 +22,13 @@ import struct
 import subprocess
 import tempfile
 import os
+import sys
 import logging
+import hashlib
+import pickle
+import shutil
+import functools
+import itertools
 import subprocess
 import re
 from collections import namedtuple, defaultdict
@@ -33,6 +39,79 @@ logger = logging.getLogger(__name__)
 CUOBJDUMP_RE_FUNC_START = re.compile(r'\s+Function : (?P<function>[^\s]*)$')
 CUOBJDUMP_RE_FUNC_END = re.compile(r'\s+\.+$')
 
+# the two above, for finding function boundaries in many lines at once.
+# Starting with a literal newline (instead of ^ with re.MULTILINE) lets
+# the regex engine skip quickly to the start of each line, and the
+# lookahead/backreference pair consumes the indentation without
+# backtracking into it (i.e. [^\S\n]++ on Python >= 3.11).
+CUOBJDUMP_FUNC_BOUNDARY = re.compile(r'\n(?=(?P<indent>[^\S\n]+))(?P=indent)(?:Function : (?P<function>[^\s]*)|\.+)(?=\n)')
+
+def _re_func_boundaries(text):
+    """Yield (start, end, function) for each match of CUOBJDUMP_FUNC_BOUNDARY in text.
+
+    function is None for end-of-function markers."""
+
+    # Every match contains 'Function : ' or ends in '.' before a
+    # newline. Searching for these is much cheaper than running the
+    # regex, so start it at the line holding the first one, and skip
+    # text that has neither (e.g. most of a large function) altogether.
+    first = [k for k in (text.find('Function : '), text.find('.\n')) if k != -1]
+    if not first:
+        return
+
+    pos = max(text.rfind('\n', 0, min(first)), 0)
+    for m in CUOBJDUMP_FUNC_BOUNDARY.finditer(text, pos):
+        yield m.start(), m.end(), m.group('function')
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+if hyperscan is not None:
+    # CUOBJDUMP_FUNC_BOUNDARY for Hyperscan, which scans a block of text
+    # without backtracking. \s is spelt out as Python's re matches it in
+    # ASCII text. Hyperscan does not support lookaheads or captures, so
+    # matches at the very end of the text (which CUOBJDUMP_FUNC_BOUNDARY
+    # would not accept) are dropped, and the function name is cut out of
+    # the matched line afterwards. Asking Hyperscan for the start of each
+    # match makes scanning several times slower, so that is found by
+    # looking back for the newline instead.
+    _HS_WS = rb'\t\x0b\x0c\r\x1c-\x1f '
+    _HS_FUNC_BOUNDARY = hyperscan.Database()
+    _HS_FUNC_BOUNDARY.compile(expressions=[rb'\n[' + _HS_WS + rb']+Function : [^\n' + _HS_WS + rb']*$',
+                                           rb'\n[' + _HS_WS + rb']+\.+$'],
+                              ids=[0, 1],
+                              flags=[hyperscan.HS_FLAG_MULTILINE] * 2)
+
+    def _hs_func_boundaries(text):
+        """Like _re_func_boundaries, using Hyperscan."""
+
+        try:
+            data = text.encode('ascii') # offsets must be the same in text and data
+        except UnicodeEncodeError:
+            yield from _re_func_boundaries(text)
+            return
+
+        found = []
+        def on_match(id, start, end, flags, context):
+            if end < len(data):
+                found.append((end, id))
+
+        _HS_FUNC_BOUNDARY.scan(data, match_event_handler=on_match)
+        found.sort()
+
+        for end, id in found:
+            start = text.rfind('\n', 0, end)
+            if id == 0:
+                yield start, end, text[text.index('Function : ', start, end) + 11:end]
+            else:
+                yield start, end, None
+
+    _func_boundaries = _hs_func_boundaries
+else:
+    _func_boundaries = _re_func_boundaries
+
 # four forms: the first is the scheduling info, second is a standard opcode, third indicates start of vliw group, fourth indicates end of vliw group
 #                                                                /* 0x001c4400e22007f6 */
 #         /*0008*/                   MOV R1, c[0x0][0x20];       /* 0x4c98078000870001 */
@@ -40,24 +119,26 @@ CUOBJDUMP_RE_FUNC_END = re.compile(r'\s+\.+$')
 #         /*00b0*/                   STG.E [R2], R0;        }    /* 0xeedc200000070200 */
 
 
-CUOBJDUMP_SASS_FMT = re.compile(r'''( (?# Instruction text group)
-                                \s+/\*(?P<loc>[0-9A-Fa-f]+)\*/ (?# address, e.g. 0008 for the first instruction) \s+
-                                (?P<startbrace>{)? (?# VLIW Start) \s+
-                                (?P<text>.*); (?# The instruction line)
-                                \s*(?P<endbrace>})? (?# VLIW End)
-                                )? (?# End instruction text group) \s+/\*\s+
-                                (?P<opcode>0x[0-9A-Fa-f]+) (?# Opcode in hexadecimal) \s+\*/$
-                                ''',
-                                re.VERBOSE)
+# These run on every line of SASS, so they are written out compactly
+# instead of using re.VERBOSE. The annotated form is:
+#
+# CUOBJDUMP_SASS_FMT = re.compile(r'''( (?# Instruction text group)
+#                                 \s+/\*(?P<loc>[0-9A-Fa-f]+)\*/ (?# address, e.g. 0008 for the first instruction) \s+
+#                                 (?P<startbrace>{)? (?# VLIW Start) \s+
+#                                 (?P<text>.*); (?# The instruction line)
+#                                 \s*(?P<endbrace>})? (?# VLIW End)
+#                                 )? (?# End instruction text group) \s+/\*\s+
+#                                 (?P<opcode>0x[0-9A-Fa-f]+) (?# Opcode in hexadecimal) \s+\*/$
+#                                 ''',
+#                                 re.VERBOSE)
+CUOBJDUMP_SASS_FMT = re.compile(r'(\s+/\*(?P<loc>[0-9A-Fa-f]+)\*/\s+(?P<startbrace>{)?\s+(?P<text>.*);\s*(?P<endbrace>})?)?'
+                                r'\s+/\*\s+(?P<opcode>0x[0-9A-Fa-f]+)\s+\*/$')
 
 BRANCH_LABEL_INFO = namedtuple('BRANCH_LABEL_INFO', 'target_label opcode')
 SASS_INSN_CUOBJDUMP = namedtuple('SASS_INSN_CUOBJDUMP', 'loc opcode text raw vliw_start vliw_end')
 SASS_DIRECTIVE = re.compile(r'\s*\..*$')
 
-NVDISASM_RE_FUNC_ENTRY = re.compile(r'''
-                                    \s+\.type\s+(?P<function>.*),@function$
-                                    ''',
-                                    re.VERBOSE)
+NVDISASM_RE_FUNC_ENTRY = re.compile(r'\s+\.type\s+(?P<function>.*),@function$')
 
 NVDISASM_BRANCH_LBL = re.compile(r'\.L_(x_)?\d+(?=:$)')
 # CAL header goes like:
@@ -65,21 +146,99 @@ NVDISASM_BRANCH_LBL = re.compile(r'\.L_(x_)?\d+(?=:$)')
 #        .type           identifier,@function
 #        .size           identifier,(.L_### - identifier)
 NVDISASM_CAL_HEADER_BEGIN = re.compile(r"\s+\.weak\s+(?P<cal_name>.+)$")
-NVDISASM_SASS_FMT = re.compile(r'''
-                               ( (?# Instruction text group)
-                                    \s+/\*(?P<loc>[0-9A-Fa-f]+)\*/ (?# address, e.g. 0008 for the first instruction) \s+
-                                    (?P<text>.*?) (?# The instruction line)
-                                        (   (?# Capture group for branch labels, e.g. (*"BRANCH_TARGETS .L_1"*) 
-                                            (?# CUDA < 11.0 has form "TARGET= .L_\d+" and cuda >= 11.0 has form "BRANCH_TARGETS .L_\d+")
-                                            \(\*"(BRANCH_TARGETS|TARGET=)\s+ 
-                                            (?P<branch_target>\.L_(x_)?\d+) (?# The actual branch label matches .L_x?_?\d+)
-                                            \s*"\*\)\s*
-                                        )?
-                                    ;  (?# Always have ';' with -novliw flag)
-                                )? (?# End instruction text group) \s+/\*\s+
-                                (?P<opcode>0x[0-9A-Fa-f]+) (?# Hexadecimal opcode) \s+\*/$
-                                ''',
-                                re.VERBOSE)
+
+# The two above are checked against every line of nvdisasm output, so
+# _get_fn_bra_targets uses these string-based equivalents instead.
+
+def _is_branch_label(l):
+    """Return True if NVDISASM_BRANCH_LBL matches l."""
+
+    return l[:3] == '.L_' and l[-1:] == ':' and (l[3:-1].isdecimal() or (l[3:5] == 'x_' and l[5:-1].isdecimal()))
+
+def _cal_header_name(l):
+    """Return the cal_name NVDISASM_CAL_HEADER_BEGIN matches in l, or None."""
+
+    s = l.lstrip()
+    if len(s) == len(l) or s[:5] != '.weak':
+        return None
+
+    rest = s[5:]
+    if len(rest) < 2 or not rest[0].isspace():
+        return None
+
+    # as in the regex, a name of only whitespace is its last character
+    return rest.lstrip() or rest[-1]
+
+# Annotated form, see CUOBJDUMP_SASS_FMT:
+#
+# NVDISASM_SASS_FMT = re.compile(r'''
+#                                ( (?# Instruction text group)
+#                                     \s+/\*(?P<loc>[0-9A-Fa-f]+)\*/ (?# address, e.g. 0008 for the first instruction) \s+
+#                                     (?P<text>.*?) (?# The instruction line)
+#                                         (   (?# Capture group for branch labels, e.g. (*"BRANCH_TARGETS .L_1"*)
+#                                             (?# CUDA < 11.0 has form "TARGET= .L_\d+" and cuda >= 11.0 has form "BRANCH_TARGETS .L_\d+")
+#                                             \(\*"(BRANCH_TARGETS|TARGET=)\s+
+#                                             (?P<branch_target>\.L_(x_)?\d+) (?# The actual branch label matches .L_x?_?\d+)
+#                                             \s*"\*\)\s*
+#                                         )?
+#                                     ;  (?# Always have ';' with -novliw flag)
+#                                 )? (?# End instruction text group) \s+/\*\s+
+#                                 (?P<opcode>0x[0-9A-Fa-f]+) (?# Hexadecimal opcode) \s+\*/$
+#                                 ''',
+#                                 re.VERBOSE)
+NVDISASM_SASS_FMT = re.compile(r'(\s+/\*(?P<loc>[0-9A-Fa-f]+)\*/\s+(?P<text>.*?)'
+                               r'(\(\*"(BRANCH_TARGETS|TARGET=)\s+(?P<branch_target>\.L_(x_)?\d+)\s*"\*\)\s*)?;)?'
+                               r'\s+/\*\s+(?P<opcode>0x[0-9A-Fa-f]+)\s+\*/$')
+
+_HEXDIGITS = frozenset('0123456789abcdefABCDEF')
+
+# Nearly all lines of nvdisasm SASS have one of the rigid shapes shown
+# above, so they are split using string methods, and only lines that do
+# not look like that are handed to the regular expression passed in as
+# sass_match (NVDISASM_SASS_FMT.match). The following returns exactly
+# what the regular expression would have. _sass_parse.pyx contains a
+# compiled version of it that is used instead when available.
+
+def _fast_parse_nvdisasm_line(l, sass_match):
+    """Parse a line of nvdisasm -novliw SASS into (loc, branch_target, opcode).
+
+    Returns None if the line is not SASS. Lines with a branch target
+    annotation always use the regular expression."""
+
+    if '(*"' not in l:
+        head, _, tail = l.rpartition('/*')
+        if tail[-2:] == '*/' and tail[:1].isspace() and tail[-3:-2].isspace() and head[-1:].isspace():
+            opcode = tail[:-2].strip()
+            if len(opcode) > 2 and opcode[:2] == '0x' and _HEXDIGITS.issuperset(opcode[2:]):
+                if head.isspace():
+                    return (None, None, opcode)
+
+                h = head.lstrip()
+                if h[:2] == '/*' and head[:1].isspace():
+                    loc, sep, rest = h[2:].partition('*/')
+                    if sep and loc and _HEXDIGITS.issuperset(loc) and rest[:1].isspace() and rest.rstrip()[-1:] == ';':
+                        return (loc, None, opcode)
+
+    m = sass_match(l)
+    if m is None:
+        return None
+
+    return m.group('loc', 'branch_target', 'opcode')
+
+try:
+    # only present if Cython was available when harmonv was installed
+    from harmonv._sass_parse import parse_nvdisasm_line as _fast_parse_nvdisasm_line
+except ImportError:
+    pass
+
+def _namedtuple_to_dict(x):
+    # cheaper than dict(x._asdict()), which builds the dict twice
+    return dict(zip(x._fields, x))
+
+# attributes of SASSFunction that to_dict() only emits when not None
+_TO_DICT_OPTIONAL = ('sharedmem', 'numbar', 'numregs', 'regcount', 'frame_size',
+                     'min_stack_size', 'max_stack_size', 'global_init_data',
+                     'global_init_offsets', 'global_offsets')
 
 class SASSFunction(object):
     def __init__(self, function, sass_disassembly, producer, headers = None, sass_binary = None):
@@ -110,6 +269,43 @@ class SASSFunction(object):
     def __str__(self):
         return f"SASSFunction(function={repr(self.function)})"
 
+    @classmethod
+    def from_cubin(cls, fn, cubin, sass_disassembly, headers, producer = 'cuobjdump',
+                   branch_targets = None, syminfo = None, cubin_info = None):
+        """Create the SASSFunction for fn, taking its information from cubin.
+
+        syminfo (symbol name -> nvglobal) and cubin_info are the same for
+        all functions in cubin, and can be passed in to avoid recomputing
+        them for every function."""
+
+        if syminfo is None:
+            syminfo = dict([(st.name, st) for st in cubin.nvglobals])
+
+        if cubin_info is None:
+            cubin_info = {'arch': cubin.arch}
+
+        out = cls(fn, sass_disassembly, producer, headers = headers)
+        out.branch_targets = branch_targets
+        out.arg_info = cubin.get_args().get(fn)
+        out.fn_info = cubin.get_fn_info().get(fn)
+        out.constants = cubin.constants.get(fn)
+        if '' in cubin.constants: out.set_constants(cubin.constants[''], update=True)
+        if fn in syminfo: out.set_syminfo(syminfo[fn])
+        out.sharedmem = cubin.sharedmem.get(fn)
+        if f'.text.{fn}' in cubin.relocations:
+            out.set_relocations(cubin.relocations[f'.text.{fn}'])
+        out.numbar = cubin.numbar.get(fn)
+        # like set_regcount, regcount is stored in numregs
+        out.numregs = cubin.regcount.get(fn, cubin.numregs.get(fn))
+        out.frame_size = cubin.frame_size.get(fn)
+        out.max_stack_size = cubin.max_stack_size.get(fn)
+        out.min_stack_size = cubin.min_stack_size.get(fn)
+        out.cubin_info = cubin_info
+        out.global_init_data = cubin.global_init_data
+        out.global_init_offsets = cubin.global_init_symbol_offset
+        out.global_offsets = cubin.global_symbol_offset
+        return out
+
     def set_arg_info(self, args):
         self.arg_info = args
 
@@ -175,10 +371,10 @@ class SASSFunction(object):
                'headers': self.headers,
                'binary': self.binary,
                'cubin_info': self.cubin_info,
-               'disassembly': [dict(x._asdict()) for x in self.disassembly]}
+               'disassembly': [_namedtuple_to_dict(x) for x in self.disassembly]}
 
         if self.arg_info:
-            out['arg_info'] = [dict(x._asdict()) for x in self.arg_info]
+            out['arg_info'] = [_namedtuple_to_dict(x) for x in self.arg_info]
 
         if self.fn_info:
             out['fn_info'] = self.fn_info
@@ -192,37 +388,12 @@ class SASSFunction(object):
         if self.sym_info:
             out['sym_info'] = self.sym_info
 
-        if self.sharedmem is not None:
-            out['sharedmem'] = self.sharedmem
-
-        if self.numbar is not None:
-            out['numbar'] = self.numbar
-
-        if self.numregs is not None:
-            out['numregs'] = self.numregs
-
-        if self.regcount is not None:
-            out['regcount'] = self.regcount
-
-        if self.frame_size is not None:
-            out['frame_size'] = self.frame_size
-
-        if self.min_stack_size is not None:
-            out['min_stack_size'] = self.min_stack_size
-
-        if self.max_stack_size is not None:
-            out['max_stack_size'] = self.max_stack_size
-
-        if self.global_init_data is not None:
-            # NOTE: This will leave Yaml anchors / aliases in the output
-            out['global_init_data'] = self.global_init_data
-
-        if self.global_init_offsets is not None:
-            # NOTE: This will leave Yaml anchors / aliases in the output
-            out['global_init_offsets'] = self.global_init_offsets
-
-        if self.global_offsets is not None:
-            out['global_offsets'] = self.global_offsets
+        # NOTE: global_init_data and global_init_offsets will leave Yaml
+        # anchors / aliases in the output
+        for k in _TO_DICT_OPTIONAL:
+            v = getattr(self, k)
+            if v is not None:
+                out[k] = v
 
         if self.branch_targets is not None:
             out['branch_targets'] = self.branch_targets
@@ -232,38 +403,153 @@ class SASSFunction(object):
         return out
 
 
+def _complete_lines(pieces):
+    # regroup pieces of text so that each ends on a line boundary
+    partial = ''
+    for piece in pieces:
+        piece = partial + piece
+        k = piece.rfind('\n') + 1
+        partial = piece[k:]
+        if k:
+            yield piece[:k]
+
+    if partial:
+        yield partial + '\n'
+
+def _tmp_dir():
+    # the temporary cubin is only ever read back by cuobjdump/nvdisasm,
+    # so keep it in memory (tmpfs) when possible
+    if sys.platform.startswith('linux') and os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+
+    return None # use tempfile's default
+
+def _write_tmp_cubin(cubin_data):
+    # returns the name of a temporary file holding cubin_data, which is
+    # written to tempfile's default directory if it cannot be created in
+    # or does not fit in _tmp_dir() (e.g. a small /dev/shm in a container)
+    for tmp_dir in [_tmp_dir(), None]:
+        f = None
+        try:
+            f = tempfile.NamedTemporaryFile(suffix=".cubin", dir=tmp_dir, delete=False)
+            with f:
+                f.write(cubin_data)
+
+            return f.name
+        except OSError:
+            if f is not None:
+                os.unlink(f.name)
+
+            if tmp_dir is None:
+                raise
+
+# Set HARMONV_CACHE=1 to cache the parsed output of cuobjdump/nvdisasm
+# in $XDG_CACHE_HOME/harmonv (default: ~/.cache/harmonv). Bump
+# _CACHE_VERSION whenever the parsed format changes.
+_CACHE_VERSION = 1
+
+def _cache_file(cubin_data, args, nvds_args, add_branch_targets):
+    if os.environ.get('HARMONV_CACHE') != '1':
+        return None
+
+    h = hashlib.blake2b(cubin_data, digest_size=32)
+    h.update(repr((_CACHE_VERSION, args, nvds_args, add_branch_targets)).encode('ascii'))
+
+    # a different toolkit may disassemble differently
+    for tool in ['cuobjdump'] + (['nvdisasm'] if add_branch_targets else []):
+        path = shutil.which(tool)
+        if path is not None:
+            h.update(f'{path}:{os.stat(path).st_mtime_ns}'.encode())
+
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'harmonv', h.hexdigest() + '.pkl')
+
+def _cache_load(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f'Ignoring unreadable disassembly cache file {cache_file}: {e}')
+        return None
+
+def _cache_store(cache_file, data):
+    # caching is best-effort, so no failure here (including pickle
+    # failing on data) may fail the disassembly
+    tmp_name = None
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+            tmp_name = f.name
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # readers never see a partially written file
+        os.replace(tmp_name, cache_file)
+    except Exception as e:
+        logger.warning(f'Could not write disassembly cache file {cache_file}: {e}')
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+
 class DisassemblerCUObjdump(object):
     @staticmethod
     def _parse_cuobjdump_output(src, output):
-        """Get per-function SASS dumps."""
+        """Get per-function SASS dumps.
+
+        output is either all of cuobjdump's output, or an iterable of
+        pieces of it, e.g. its lines or blocks read from its stdout.
+        Pieces need not end on line boundaries."""
+        if isinstance(output, str):
+            output = [output]
+
         out = {}
         fn = None
         fn_name = None
-        for lno, l in enumerate(output.splitlines(), 1):
-            m = CUOBJDUMP_RE_FUNC_START.match(l) # don't have to do this on every line
-            if m is not None:
-                assert fn_name is None, f"{lno}: Previous function {fn_name} did not end properly"
-                fn_name = m.group('function')
-                fn = []
-            else:
-                if CUOBJDUMP_RE_FUNC_END.match(l):
-                    assert fn_name is not None, f"{lno}: End-of-function marker found when no function active"
+        lno = 0 # lines before the current piece
+
+        # find function boundaries with a single scan over each piece,
+        # the lines in between are split off in bulk
+        boundaries = _func_boundaries
+
+        for piece in _complete_lines(output):
+            # CUOBJDUMP_FUNC_BOUNDARY starts with the newline that ends
+            # the previous line.
+            text = '\n' + piece
+
+            def lineno(pos):
+                return lno + text.count('\n', 0, pos) + 1
+
+            start = 0 # newline before the first line not yet handled
+            for m_start, m_end, function in boundaries(text):
+                if fn_name:
+                    fn.extend(text[start:m_start].split('\n')[1:])
+
+                start = m_end
+                if function is not None:
+                    assert fn_name is None, f"{lineno(m_start)}: Previous function {fn_name} did not end properly"
+                    fn_name = function
+                    fn = []
+                else:
+                    assert fn_name is not None, f"{lineno(m_start)}: End-of-function marker found when no function active"
                     out[fn_name] = fn
                     fn_name = None
                     fn = None
-                else:
-                    if fn_name:
-                        fn.append(l)
-                    else:
-                        # debug here for lines that 'slip through'
-                        #print(l)
-                        pass
+
+            if fn_name:
+                fn.extend(text[start:-1].split('\n')[1:])
+
+            lno += piece.count('\n')
 
         return out
 
     @staticmethod
     def _parse_fn_sass(fn_output):
         out = {}
+        sass_match = CUOBJDUMP_SASS_FMT.match
 
         for fn, data in fn_output.items():
             header = []
@@ -271,7 +557,7 @@ class DisassemblerCUObjdump(object):
 
             # data consists of header lines, followed by disassembly
             for lno, l in enumerate(data, 1):
-                m = CUOBJDUMP_SASS_FMT.match(l)
+                m = sass_match(l)
                 if not m:
                     assert len(disasm) == 0, f"{lno}: Line '{l}' in middle of disassembly does not match SASS disassembly regular expression"
                     header.append(l)
@@ -294,6 +580,7 @@ class DisassemblerCUObjdump(object):
         out = {}
 
         parser = disasm_parser.DisassemblyParser(src)
+        directive_match = SASS_DIRECTIVE.match
 
         for fn, data in fn_output.items():
             header = []
@@ -301,7 +588,7 @@ class DisassemblerCUObjdump(object):
 
             # data consists of header lines, followed by disassembly
             for lno, l in enumerate(data, 1):
-                m = SASS_DIRECTIVE.match(l)
+                m = directive_match(l)
                 if m:
                     assert len(disasm) == 0, f"{src}:{lno}: Line '{l}' in middle of disassembly looks like a directive, was expecting disassembly"
                     header.append(l)
@@ -310,89 +597,189 @@ class DisassemblerCUObjdump(object):
                     break
 
 
-            disasm_text  = '\n'.join(data[lno:])
-            disasm = parser.parse(disasm_text)
+            disasm = parser.parse_lines(data[lno:])
 
             out[fn] = (header, disasm)
 
         return out
     
     @staticmethod
-    def _get_nvdisasm_bra_targets(src, nvds_output, fn_output):
-        # Get mangled names of functions to isolate
-        fns = set(fn_output.keys())
+    def _get_fn_bra_targets(lines, start, insns):
+        """Get the branch targets of the function whose body starts at lines[start].
 
-        status = 'Entry'
-        active_fn = None
+        Returns (targets, end) where end is the index of the line after
+        the function, or (None, None) if the function does not end."""
 
+        loc_to_opcode = {insn.loc: insn.opcode for insn in insns}
         branch_label_dict = {}
         label_targets = {}
-        branch_targets = defaultdict(dict)
         first_instr_found = False
-        awaiting_cal_name = None
-        nvds_output += '\n' # Ensure last line is empty
+        awaiting_cal_name = None # set while inside a CAL header
+        last_line_label = None
 
-        for lno, l in enumerate(nvds_output.splitlines(), 1):
-            if status == 'Start' and l == f'{active_fn}:':
-                status = 'End'
-                continue
-            elif status == 'Entry':
-                m = NVDISASM_RE_FUNC_ENTRY.match(l)
-                if m is None or m.group('function') not in fns:
-                    last_line_label = None
-                    continue
-                active_fn = m.group('function')
-                status = 'Start'
-            
-            elif status == 'End' and l == '' and last_line_label is not None:
-                    # Function end is always a label followed by an empty line
-                for insn in filter(lambda x: x.loc in branch_label_dict, fn_output[active_fn][1]): 
-                    assert insn.opcode == branch_label_dict[insn.loc].opcode, f"{lno}: Branch label {insn.loc} does not match opcode {insn.opcode}"
-                    branch_targets[active_fn][insn.loc] = label_targets.get(branch_label_dict[insn.loc].target_label)
-                active_fn = None
-                status = 'Entry'
-                first_instr_found = False
-                branch_label_dict = {}
-                label_targets = {}
-                last_line_label = None
-            elif status == 'End' and (lbl_match := NVDISASM_BRANCH_LBL.match(l)):
-                last_line_label = lbl_match.group(0)
-                continue
-            elif status == 'End' and (cal_match := NVDISASM_CAL_HEADER_BEGIN.match(l)) is not None:
-                awaiting_cal_name = cal_match.group('cal_name')
-                status = 'CalEntry'
-                last_line_label = None
-            elif status == 'CalEntry':
+        parse_line = _fast_parse_nvdisasm_line
+        sass_match = NVDISASM_SASS_FMT.match
+
+        for lno in range(start, len(lines)):
+            l = lines[lno]
+            if awaiting_cal_name is not None:
                 if l == f'{awaiting_cal_name}:':
                     awaiting_cal_name = None
-                    status = 'End'
                 else:
-                    assert awaiting_cal_name in l, f"{lno}: Line '{l}' in middle of disassembly does not match regex."
+                    assert awaiting_cal_name in l, f"{lno + 1}: Line '{l}' in middle of disassembly does not match regex."
+                last_line_label = None
+            elif l == '' and last_line_label is not None:
+                # Function end is always a label followed by an empty line
+                targets = {}
+                for loc, info in branch_label_dict.items():
+                    if loc in loc_to_opcode:
+                        assert loc_to_opcode[loc] == info.opcode, f"{lno + 1}: Branch label {loc} does not match opcode {loc_to_opcode[loc]}"
+                        targets[loc] = label_targets.get(info.target_label)
+
+                return targets, lno + 1
+            elif l[-1:] == ':' and _is_branch_label(l):
+                last_line_label = l[:-1]
+            elif '.weak' in l and (cal_name := _cal_header_name(l)) is not None:
+                awaiting_cal_name = cal_name
                 last_line_label = None
-            elif status == 'End':
-                m = NVDISASM_SASS_FMT.match(l)
+            else:
+                m = parse_line(l, sass_match)
                 if first_instr_found:
-                    assert m is not None, f"{lno}: Line in middle of disassembly does not match regex.\n\t{l}"
+                    assert m is not None, f"{lno + 1}: Line in middle of disassembly does not match regex.\n\t{l}"
                 else:
-                    first_instr_found = m is not None and m.group('loc') is not None
+                    first_instr_found = m is not None and m[0] is not None
                 if m is not None:
-                    if last_line_label is not None and m.group('loc') is not None:
-                        label_targets[last_line_label] = m.group('loc')
+                    loc, branch_target, opcode = m
+                    if last_line_label is not None and loc is not None:
+                        label_targets[last_line_label] = loc
                         last_line_label = None
                     elif last_line_label is not None:
                         logger.info(f"Line '{l}' labeled by {last_line_label} has no pc. Label will point to the following line")
-                    if m.group('branch_target') is not None:
-                        branch_label_dict[m.group('loc')] = BRANCH_LABEL_INFO(m.group('branch_target'), m.group('opcode'))
+                    if branch_target is not None:
+                        branch_label_dict[loc] = BRANCH_LABEL_INFO(branch_target, opcode)
+
+        return None, None
+
+    @staticmethod
+    def _get_nvdisasm_bra_targets(src, nvds_output, fn_output):
+        """Get per-function branch targets from nvdisasm's output.
+
+        nvds_output is either all of the output, or an iterable of pieces
+        of it as in _parse_cuobjdump_output."""
+
+        # Get mangled names of functions to isolate
+        fns = set(fn_output.keys())
+
+        branch_targets = defaultdict(dict)
+        if isinstance(nvds_output, str):
+            nvds_output = [nvds_output]
+
+        lines = []
+        for piece in _complete_lines(itertools.chain(nvds_output, ['\n'])): # Ensure last line is empty
+            lines.extend(piece.splitlines())
+
+        fn_entry_match = NVDISASM_RE_FUNC_ENTRY.match
+
+        # Outside of functions, only the '.type fn,@function' lines that
+        # begin them matter, so find those first ...
+        entries = [lno for lno, l in enumerate(lines) if l.endswith(',@function')]
+
+        # ... and then only walk the bodies of the functions we want.
+        end = 0
+        for lno in entries:
+            if lno < end:
+                continue # e.g. the .type of a CAL header in the previous function
+
+            m = fn_entry_match(lines[lno])
+            if m is None or m.group('function') not in fns:
+                continue
+
+            active_fn = m.group('function')
+            try:
+                start = lines.index(f'{active_fn}:', lno + 1)
+            except ValueError:
+                break
+
+            targets, end = DisassemblerCUObjdump._get_fn_bra_targets(lines, start + 1, fn_output[active_fn][1])
+            if targets is None:
+                break
+
+            if targets:
+                branch_targets[active_fn].update(targets)
 
         return branch_targets
 
+    @staticmethod
+    def _run_disassemblers(src, cubin_data, args, nvds_args, add_branch_targets):
+        """Run cuobjdump (and nvdisasm, for branch targets) on cubin_data.
+
+        Returns the parsed (fn_headers_sass, fn_branch_dests)."""
+        tmpcubin = _write_tmp_cubin(cubin_data)
+
+        nvds_proc = None
+        nvds_stdout = None
+        try:
+            if add_branch_targets:
+                # run nvdisasm alongside cuobjdump. Its output goes to a
+                # file rather than a pipe so that it does not stall once
+                # the pipe fills up while we are busy parsing.
+                # It can be much larger than the cubin, so it is not
+                # kept in _tmp_dir().
+                nvds_stdout = tempfile.TemporaryFile()
+                nvds_proc = subprocess.Popen(['nvdisasm'] + nvds_args + ['-c', '-hex', '-novliw', tmpcubin],
+                                             stdout=nvds_stdout)
+
+            # parse the output as cuobjdump produces it, instead of
+            # waiting for (and holding) all of it
+            with subprocess.Popen(['cuobjdump'] + args + ['-sass', tmpcubin],
+                                  stdout=subprocess.PIPE, encoding='ascii',
+                                  bufsize=1<<20) as p:
+                chunks = iter(functools.partial(p.stdout.read, 1<<20), '')
+                try:
+                    by_function = DisassemblerCUObjdump._parse_cuobjdump_output(src, chunks)
+                except Exception:
+                    # output that does not parse may just be that of a
+                    # failing cuobjdump, whose failure is reported instead.
+                    # Drain the pipe first so that cuobjdump exits by itself.
+                    for _ in chunks:
+                        pass
+
+                    if p.wait() != 0:
+                        raise subprocess.CalledProcessError(p.returncode, p.args)
+
+                    raise
+
+            if p.returncode != 0:
+                raise subprocess.CalledProcessError(p.returncode, p.args)
+
+            fn_headers_sass = DisassemblerCUObjdump._parse_fn_sass_2(src, by_function)
+            if add_branch_targets:
+                if nvds_proc.wait() != 0:
+                    raise subprocess.CalledProcessError(nvds_proc.returncode, nvds_proc.args)
+
+                # decode a block at a time rather than holding all of
+                # the output (as bytes, and again as str) in memory
+                nvds_stdout.seek(0)
+                nvds_output = (block.decode('ascii') for block in iter(functools.partial(nvds_stdout.read, 1 << 20), b''))
+                fn_branch_dests = DisassemblerCUObjdump._get_nvdisasm_bra_targets(src, nvds_output, fn_headers_sass)
+            else:
+                fn_branch_dests = None
+
+            return fn_headers_sass, fn_branch_dests
+        finally:
+            if nvds_proc is not None and nvds_proc.poll() is None:
+                nvds_proc.kill()
+                nvds_proc.wait()
+
+            if nvds_stdout is not None:
+                nvds_stdout.close()
+
+            os.unlink(tmpcubin)
+
     @staticmethod
     def disassemble(cubin, function_names = None, function_index = None, _keep = False, src = '<unknown>', add_branch_targets=False):
         function_names = [] if function_names is None else function_names
         cubin_data = cubin.get_data()
-        fnargs = cubin.get_args()
-        fninfo = cubin.get_fn_info()
-        const = cubin.constants
         syminfo = dict([(st.name, st) for st in cubin.nvglobals])
 
         cubin_info = {'arch': cubin.arch}
@@ -409,51 +796,21 @@ class DisassemblerCUObjdump(object):
             nvds_args.append(str(function_index))
             args.extend(nvds_args)
         out = {}
-        with tempfile.NamedTemporaryFile(suffix=".cubin", delete=False) as f:
-            f.write(cubin_data)
-            tmpcubin = f.name
+        cache_file = _cache_file(cubin_data, args, nvds_args, add_branch_targets)
         try:
-            output = subprocess.check_output(['cuobjdump'] + args + ['-sass', tmpcubin]).decode('ascii')
-            by_function = DisassemblerCUObjdump._parse_cuobjdump_output(src, output)
-            fn_headers_sass = DisassemblerCUObjdump._parse_fn_sass_2(src, by_function)
-            if add_branch_targets:
-                nvds_output = subprocess.check_output(['nvdisasm'] + nvds_args + ['-c', '-hex', '-novliw', tmpcubin]).decode('ascii')
-                fn_branch_dests = DisassemblerCUObjdump._get_nvdisasm_bra_targets(src, nvds_output, fn_headers_sass)
+            parsed = _cache_load(cache_file) if cache_file is not None else None
+            if parsed is None:
+                parsed = DisassemblerCUObjdump._run_disassemblers(src, cubin_data, args, nvds_args, add_branch_targets)
+                if cache_file is not None:
+                    _cache_store(cache_file, parsed)
+
+            fn_headers_sass, fn_branch_dests = parsed
             for fn, (hdr, sass) in fn_headers_sass.items():
-                out[fn] = SASSFunction(fn, sass_disassembly=sass, producer='cuobjdump', headers=hdr)
-                if add_branch_targets and fn in fn_branch_dests: out[fn].set_branch_targets(fn_branch_dests[fn])
-                if fn in fnargs: out[fn].set_arg_info(fnargs[fn])
-                if fn in fninfo: out[fn].set_fn_info(fninfo[fn])
-                if fn in const: out[fn].set_constants(const[fn])
-                if fn in syminfo: out[fn].set_syminfo(syminfo[fn])
-                if '' in const: out[fn].set_constants(const[''], update=True)
-                if fn in cubin.sharedmem:
-                    out[fn].set_sharedmem(cubin.sharedmem[fn])
-                if f'.text.{fn}' in cubin.relocations:
-                    out[fn].set_relocations(cubin.relocations[f'.text.{fn}'])
-                if fn in cubin.numbar:
-                    out[fn].set_numbar(cubin.numbar[fn])
-                if fn in cubin.numregs:
-                    out[fn].set_numregs(cubin.numregs[fn])
-                if fn in cubin.regcount:
-                    out[fn].set_regcount(cubin.regcount[fn])
-                if fn in cubin.frame_size:
-                    out[fn].set_frame_size(cubin.frame_size[fn])
-                if fn in cubin.max_stack_size:
-                    out[fn].set_max_stack_size(cubin.max_stack_size[fn])
-                if fn in cubin.min_stack_size:
-                    out[fn].set_min_stack_size(cubin.min_stack_size[fn])
-                out[fn].cubin_info = cubin_info
-                out[fn].set_global_init_data(cubin.global_init_data)
-                out[fn].set_global_init_offsets(cubin.global_init_symbol_offset)
-                out[fn].set_global_offsets(cubin.global_symbol_offset)
+                branch_targets = fn_branch_dests.get(fn) if add_branch_targets else None
+                out[fn] = SASSFunction.from_cubin(fn, cubin, sass, hdr, branch_targets=branch_targets,
+                                                  syminfo=syminfo, cubin_info=cubin_info)
         except subprocess.CalledProcessError as e:
             logger.error(f'ERROR: cuobjdump failed to handle cubin (arch={cubin.arch}): {e}')
             return out
-        except:
-            raise
-        finally:
-            os.unlink(tmpcubin)
 
         return out
-
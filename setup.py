@@ -2,7 +2,7 @@
 #
 # SPDX-License-Identifier: MIT
 
-from setuptools import setup
+from setuptools import setup, Extension
 from setuptools.command.install import install
 from setuptools.command.develop import develop
 
@@ -12,6 +12,23 @@ def _run_make_ptx():
     check_call(['make', '-C', 'harmonv/ptx'])
 
 
+def _ext_modules():
+    # the compiled SASS line parsers are optional, disassembler.py
+    # falls back to pure Python versions if they are not built
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        return []
+
+    # optional, so that a failed compile (e.g. no C compiler) is not an
+    # error. cythonize does not copy optional to the extensions it
+    # returns, so it is set again afterwards.
+    ext_modules = cythonize([Extension('harmonv._sass_parse', ['harmonv/_sass_parse.pyx'], optional=True)])
+    for ext in ext_modules:
+        ext.optional = True
+
+    return ext_modules
+
 class CustomInstall(install):
     def run(self):
         _run_make_ptx()
@@ -26,6 +43,7 @@ setup(name='harmonv',
       version='0.2',
       packages=['harmonv'],
       cmdclass={'install': CustomInstall, 'develop': CustomDevelop},
+      ext_modules=_ext_modules(),
       package_data={'harmonv': ['ptx/*.cfg', 'ptx/*.interp', 'ptx/*.tokens']},
       scripts=['bin/hcuobjdump',
                'bin/gen_xlat_metadata.py',